@@ -0,0 +1,70 @@
+"""
+Helpers shared by the gallery and nbheader extensions.
+"""
+import functools
+import json
+import os
+
+from pathlib import Path
+
+import nbformat
+
+# orjson is an optional dependency, faster than json to parse notebooks.
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+@functools.lru_cache(maxsize=None)
+def list_files(dirpath):
+    """
+    Return the (path, name, stem) of the files found in a directory,
+    ignoring hidden files like glob does.
+
+    The section directories are listed by both the gallery and the
+    nbheader extensions, the listing is cached to read them only once.
+    The gallery extension clears the cache when it starts.
+    """
+    with os.scandir(dirpath) as it:
+        return tuple(
+            (entry.path, entry.name, os.path.splitext(entry.name)[0])
+            for entry in it
+            if not entry.name.startswith('.') and entry.is_file()
+        )
+
+
+def json_loads(raw):
+    """
+    Parse JSON with orjson if available, falling back to json for
+    the documents orjson rejects, like the NaN and Infinity values
+    that json (and so nbformat.write) emits by default.
+    """
+    if orjson is not None:
+        try:
+            return orjson.loads(raw)
+        except orjson.JSONDecodeError:
+            pass
+    return json.loads(raw)
+
+
+def read_notebook(nb_path):
+    """
+    Read a notebook with a plain JSON parse, skipping the validation
+    and conversion done by nbformat.read. The notebook is validated
+    when written back with nbformat.write.
+    """
+    raw = Path(nb_path).read_bytes()
+    nb = json_loads(raw)
+    if nb.get('nbformat') != 4:
+        return nbformat.reads(raw, as_version=4)
+    return nbformat.from_dict(nb)
+
+
+def cell_source(cell):
+    """
+    Return the source of a cell as a string, it's stored on disk as
+    a list of lines.
+    """
+    source = cell['source']
+    return source if isinstance(source, str) else ''.join(source)
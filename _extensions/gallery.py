@@ -1,15 +1,24 @@
-import glob
+import concurrent.futures
+import fnmatch
+import functools
+import hashlib
 import os
-
-from pathlib import Path
+import re
 
 import nbformat
 import sphinx.util
 
+import _gallery_common
+from _gallery_common import cell_source, list_files, read_notebook
+
 logger = sphinx.util.logging.getLogger('gallery-extension')
 
 
-INLINE_THUMBNAIL_TEMPLATE = """
+def render_card(title, section_path, fname, description, thumbnail, labels):
+    """
+    Return the rst of a gallery card, as an f-string compiled once.
+    """
+    return f"""
     .. grid-item-card:: :doc:`{title} <{section_path}/{fname}>`
         :shadow: md
 
@@ -48,45 +57,251 @@ DEFAULT_GALLERY_CONF = {
 
 def sort_index_first(files):
     """
-    Sort the files, putting 'index.ipynb' first.
+    Sort the (path, name, stem) files, putting 'index.ipynb' first.
     """
-    files = files.copy()
-    index_idx = None
-
-    for i, file in enumerate(files):
-        if os.path.basename(file) == 'index.ipynb':
-            index_idx = i
+    index_file = None
+    other_files = []
+    for file in files:
+        if file[1] == 'index.ipynb':
+            index_file = file
+        else:
+            other_files.append(file)
 
-    assert index_idx is not None, f'index.ipynb not found in {files}'
+    assert index_file is not None, f'index.ipynb not found in {files}'
 
-    sorted_files = [files.pop(index_idx)]
-    sorted_files.extend(sorted(files))
-    return sorted_files
+    return [index_file] + sorted(other_files)
 
 
 def generate_project_toctree(files):
-    toctree = '.. toctree::\n'
-    toctree += '   :hidden:\n\n'
-    for file in files:
-        name = Path(file).stem
-        if name == 'index':
-            continue
-        toctree += f'   {name}\n'
-    return toctree
+    toctree = ['.. toctree::\n', '   :hidden:\n\n']
+    toctree.extend(f'   {stem}\n' for _, _, stem in files if stem != 'index')
+    return ''.join(toctree)
 
 
 def insert_toctree(nb_path, toctree):
-    nb = nbformat.read(nb_path, as_version=4)
+    try:
+        nb = read_notebook(nb_path)
+    except FileNotFoundError:
+        logger.warning(f'Notebook {nb_path} not found, cannot insert its toctree.')
+        return
     last_cell = nb['cells'][-1]
+    last_source = cell_source(last_cell)
     toctree = "```{eval-rst}\n" + toctree + "\n```"
+    # Don't rewrite the notebook (and update its mtime) if it's already there.
+    if last_cell['cell_type'] == 'markdown' and last_source == toctree:
+        return
     toctree_cell = nbformat.v4.new_markdown_cell(source=toctree)
-    if "```{eval-rst}" in last_cell['source']:
+    if "```{eval-rst}" in last_source:
         nb['cells'][-1] = toctree_cell
     else:
         nb['cells'].append(toctree_cell)
     nbformat.write(nb, nb_path, version=nbformat.NO_CONVERT)
 
 
+def _file_matcher(extensions):
+    """
+    Return a function checking whether a file name matches one of the
+    extension patterns (e.g. '*.ipynb'), compiled once per gallery.
+    """
+    # Simple '*.ext' patterns only require a suffix check.
+    if all(ext.startswith('*.') and not re.search(r'[*?[]', ext[1:]) for ext in extensions):
+        suffixes = tuple(ext[1:] for ext in extensions)
+        return lambda name: name.endswith(suffixes)
+    patterns = [re.compile(fnmatch.translate(ext)) for ext in extensions]
+    return lambda name: any(pattern.match(name) for pattern in patterns)
+
+
+def _list_section_files(dest_dir, match_file):
+    """
+    Return the (path, name, stem) of the files of a section matching the
+    extensions, ignoring hidden files like glob does.
+    """
+    try:
+        files = list_files(dest_dir)
+    except FileNotFoundError:
+        return []
+    return [file for file in files if match_file(file[1])]
+
+
+def _file_names(dirpath):
+    """
+    Return the set of the file names found in a directory, read with a
+    single scandir call. Empty if the directory doesn't exist.
+
+    Unlike list_files, hidden files are included and the result isn't cached.
+    """
+    try:
+        with os.scandir(dirpath) as it:
+            return {entry.name for entry in it if entry.is_file()}
+    except FileNotFoundError:
+        return set()
+
+
+@functools.lru_cache(maxsize=None)
+def _label_snippet(labels_path, label):
+    """
+    Return the rst image directive of a label, labels being shared
+    by many sections.
+    """
+    # Prepend / to make it an "absolute" path from the root folder.
+    label_svg = '/' + os.path.join(labels_path, f'{label}.svg')
+    return ' ' * 8 + f'.. image:: {label_svg}\n'
+
+
+def _resolve_section(section, gallery_dir, labels_path, label_files, match_file):
+    """
+    Resolve a gallery section, returning a tuple of its card rst (empty
+    if it has no thumbnail) and its gallery toctree entry, or None if
+    the section has to be skipped.
+    """
+    if not 'path' in section or not section['path']:
+        raise ValueError('Missing or empty path value in section definition')
+    section_path = section['path']
+    section_title = section.get('title', section['path'])
+    description = section.get('description', None)
+    labels = section.get('labels', [])
+    skip = section.get('skip', [])
+
+    dest_dir = os.path.join(gallery_dir, section_path)
+
+    # Collect examples
+    files = _list_section_files(dest_dir, match_file)
+    if skip:
+        files = [file for file in files if file[1] not in skip]
+    
+    if not files:
+        raise ValueError(f'No files found in section {section_path!r}')
+    
+    names = {name for _, name, _ in files}
+    has_index = 'index.ipynb' in names
+
+    if len(files) > 1:
+        if not has_index:
+            logger.warning(
+                '%s has multiple files but no "index.ipynb", skipping it entirely',
+                section_title,
+            )
+            return None
+        files = sort_index_first(files)
+
+    logger.info(f"building gallery... {section_title}: {len(files)} files")
+
+    thumb_dir = os.path.join(dest_dir, 'thumbnails')
+    os.makedirs(thumb_dir, exist_ok=True)
+    thumb_files = _file_names(thumb_dir)
+
+    card_rst = ''
+    basenames = []
+    for f, _, basename in files:
+        basenames.append(basename)
+
+        # Generate a card only for the index
+        if len(files) > 1 and basename != 'index':
+            continue
+
+        thumb_name = '%s.png' % basename
+        thumb_path = os.path.join(thumb_dir, thumb_name)
+
+        # Try existing file
+        if thumb_name not in thumb_files:
+            logger.warning(f'Notebook {f} has no thumbnail.')
+            continue
+
+        for label in labels:
+            if f'{label}.svg' not in label_files:
+                raise FileNotFoundError(
+                    f'Label {label!r} must have an SVG file in {labels_path}'
+                )
+        labels_str = ''.join(_label_snippet(labels_path, label) for label in labels)
+
+        # Description with new lines break the grid
+        description = ' '.join(description.splitlines())
+
+        # Generate the card rst
+        card_rst += render_card(
+            title=section_title, section_path=section_path, fname=basename,
+            description=description, thumbnail=thumb_path,
+            labels=labels_str,
+        )
+
+    if len(files) > 1:
+        # sort_index_first put the index notebook first
+        index_nb = files[0][0]
+        project_toctree = generate_project_toctree(files)
+        insert_toctree(index_nb, project_toctree)
+
+    # Gallery toctree: just put the index file or the only notebook available.
+    target = 'index' if 'index' in basenames else basenames[0]
+    toctree_entry = f'{section_title} <{section_path}/{target}>'
+    return card_rst, toctree_entry
+
+
+def _source_digest():
+    """
+    Return a hash of the source of this extension, which renders the
+    gallery, so that editing it invalidates the recorded fingerprint.
+    """
+    hasher = hashlib.sha256()
+    for module_path in [__file__, _gallery_common.__file__]:
+        with open(module_path, 'rb') as f:
+            hasher.update(f.read())
+    return hasher.hexdigest()
+
+
+def _fingerprint_path(app):
+    gallery_path = app.config.gallery_conf['path']
+    return os.path.join(app.builder.srcdir, gallery_path, '.gallery_fingerprint')
+
+
+def _gallery_fingerprint(app):
+    """
+    Return a hash of the gallery inputs: the extension source, its
+    configuration and the name and modification time of the files of
+    the sections, of their thumbnails and of the labels.
+    """
+    gallery_conf = app.config.gallery_conf
+    doc_dir = app.builder.srcdir
+    gallery_dir = os.path.join(doc_dir, gallery_conf['path'])
+    dirs = [os.path.join(doc_dir, '_static', gallery_conf['labels_dir'])]
+    for section in gallery_conf['sections']:
+        # Invalid sections are reported by generate_gallery, which runs
+        # anyway as the configuration is part of the fingerprint.
+        if not isinstance(section, dict) or not section.get('path'):
+            continue
+        dest_dir = os.path.join(gallery_dir, section['path'])
+        dirs.extend([dest_dir, os.path.join(dest_dir, 'thumbnails')])
+
+    hasher = hashlib.sha256(_source_digest().encode())
+    hasher.update(repr(gallery_conf).encode())
+    for dirpath in dirs:
+        try:
+            with os.scandir(dirpath) as it:
+                entries = sorted(
+                    (entry.name, entry.stat().st_mtime_ns) for entry in it
+                )
+        except FileNotFoundError:
+            entries = None
+        hasher.update(repr((dirpath, entries)).encode())
+    return hasher.hexdigest()
+
+
+def _gallery_is_unchanged(app):
+    """
+    Whether the gallery inputs are the same as the ones recorded at the
+    end of the previous build, and its index.rst is still there.
+    """
+    gallery_path = app.config.gallery_conf['path']
+    index_path = os.path.join(app.builder.srcdir, gallery_path, 'index.rst')
+    if not os.path.isfile(index_path):
+        return False
+    try:
+        with open(_fingerprint_path(app)) as f:
+            previous = f.read()
+    except FileNotFoundError:
+        return False
+    return previous == _gallery_fingerprint(app)
+
+
 def generate_gallery(app):
     """
     Adapted from generate_gallery, tailored for the HoloViz examples site.
@@ -94,8 +309,6 @@ def generate_gallery(app):
 
     # Get config
     gallery_conf = app.config.gallery_conf
-    extensions = gallery_conf['default_extensions']
-
     gallery_path = gallery_conf['path']
 
     # Get directories
@@ -109,6 +322,10 @@ def generate_gallery(app):
     static_dir = '_static'
     labels_dir = gallery_conf['labels_dir']
     labels_path = os.path.join(static_dir, labels_dir)
+    # List the available labels once instead of checking each one per section
+    label_files = _file_names(os.path.join(doc_dir, labels_path))
+    match_file = _file_matcher(gallery_conf['default_extensions'])
+    gallery_dir = os.path.join(doc_dir, gallery_path)
 
     sections = gallery_conf['sections']
     if not sections:
@@ -123,129 +340,78 @@ def generate_gallery(app):
     # Start to write gallery index.rst
 
     # Page header
-    gallery_rst = title + '\n' + '_'*len(title) + '\n'
+    gallery_parts = [title + '\n' + '_'*len(title) + '\n']
     # Page intro
     if intro:
-        gallery_rst += '\n' + intro + '\n'
+        gallery_parts.append('\n' + intro + '\n')
     # Sphinx-design grid
-    gallery_rst += '\n.. grid:: 2 2 4 4\n    :gutter: 3\n    :margin: 0\n'
+    gallery_parts.append('\n.. grid:: 2 2 4 4\n    :gutter: 3\n    :margin: 0\n')
+
+    # Sections are independent and mostly I/O bound, resolve them
+    # concurrently. map preserves their order in the output.
+    with concurrent.futures.ThreadPoolExecutor(
+        max_workers=min(32, len(sections))
+    ) as executor:
+        resolved_sections = list(executor.map(
+            lambda section: _resolve_section(
+                section, gallery_dir, labels_path, label_files, match_file
+            ),
+            sections,
+        ))
 
     toctree_entries = []
 
-    for section in sections:
-        section_path = section['path']
-        if not 'path' in section or not section['path']:
-            raise ValueError('Missing or empty path value in section definition')
-        section_title = section.get('title', section['path'])
-        description = section.get('description', None)
-        labels = section.get('labels', [])
-        skip = section.get('skip', [])
-
-        dest_dir = os.path.join(doc_dir, gallery_path, section_path)
-
-        # Collect examples
-        files = []
-        for extension in extensions:
-            files += glob.glob(os.path.join(dest_dir, extension))
-        if skip:
-            files = [f for f in files if os.path.basename(f) not in skip]
-        
-        if not files:
-            raise ValueError(f'No files found in section {section_path!r}')
-        
-        if len(files) > 1:
-            if not any(os.path.basename(file) == 'index.ipynb' for file in files):
-                logger.warning(
-                    '%s has multiple files but no "index.ipynb", skipping it entirely',
-                    section_title,
-                )
-                continue
-            files = sort_index_first(files)
-
-        logger.info(f"building gallery... {section_title}: {len(files)} files")
-
-        basenames = []
-        for f in files:
-
-            extension = f.split('.')[-1]
-            basename = os.path.basename(f)[:-(len(extension)+1)]
-            basenames.append(basename)
-
-            # Generate a card only for the index
-            if len(files) > 1 and basename != 'index':
-                continue
-
-            thumb_dir = os.path.join(dest_dir, 'thumbnails')
-            if not os.path.isdir(thumb_dir):
-                os.makedirs(thumb_dir)
-            thumb_path = os.path.join(thumb_dir, '%s.png' % basename)
-
-            # Try existing file
-            if not os.path.isfile(thumb_path):
-                logger.warning(f'Notebook {f} has no thumbnail.')
-                continue
-
-            labels_str = ''
-            for label in labels:
-                label_svg = os.path.join(labels_path, f'{label}.svg')
-                if not os.path.exists(os.path.join(doc_dir, label_svg)):
-                    raise FileNotFoundError(
-                        f'Label {label!r} must have an SVG file in {labels_path}'
-                    )
-                # Prepend / to make it an "absolute" path from the root folder.
-                label_svg = '/' + label_svg
-                labels_str += ' ' * 8 + f'.. image:: {label_svg}\n'
-
-            # Description with new lines break the grid
-            description = ' '.join(description.splitlines())
-
-            # Generate the card rst
-            this_entry = INLINE_THUMBNAIL_TEMPLATE.format(
-                title=section_title, section_path=section_path, fname=basename,
-                description=description, thumbnail=thumb_path,
-                labels=labels_str,
-            )
-            gallery_rst += this_entry
-
-        if len(files) > 1:
-            index_nb = next(file for file in files if file.endswith('index.ipynb'))
-            project_toctree = generate_project_toctree(files)
-            insert_toctree(index_nb, project_toctree)
-
-        # Gallery toctree: just put the index file or the only notebook available.
-        target = 'index' if 'index' in basenames else basenames[0]
-        toctree_entries.append(f'{section_title} <{section_path}/{target}>')
+    for resolved in resolved_sections:
+        if resolved is None:
+            continue
+        card_rst, toctree_entry = resolved
+        gallery_parts.append(card_rst)
+        toctree_entries.append(toctree_entry)
 
     # Add gallery toctree
     assert toctree_entries, 'Empty toctree entries.'
-    toctree_rst = '.. toctree::\n   :hidden:\n\n'
+    gallery_parts.append('.. toctree::\n   :hidden:\n\n')
     for toctree_entry in toctree_entries:
         toctree_entry = 'self' if toctree_entry == 'index' else toctree_entry
-        toctree_rst += f'   {toctree_entry}\n'
+        gallery_parts.append(f'   {toctree_entry}\n')
 
-    gallery_rst += toctree_rst
-
-    with open(os.path.join(doc_dir, gallery_path, 'index.rst'), 'w') as f:
-        f.write(gallery_rst)
+    with open(os.path.join(gallery_dir, 'index.rst'), 'w') as f:
+        f.writelines(gallery_parts)
 
 
 def generate_gallery_rst(app):
     """
     Adapted from generate_gallery_rst to build the HoloViz examples site.
     """
+    list_files.cache_clear()
     if DEFAULT_GALLERY_CONF == app.config.gallery_conf:
         return
-    logger.info('generating gallery...', color='white')
     gallery_conf = dict(DEFAULT_GALLERY_CONF, **app.config.gallery_conf)
 
     # this assures I can call the config in other places
     app.config.gallery_conf = gallery_conf
+    if _gallery_is_unchanged(app):
+        logger.info('gallery unchanged, skipping its generation', color='white')
+        return
+    logger.info('generating gallery...', color='white')
     generate_gallery(app)
 
 
+def record_gallery_fingerprint(app, env, docnames):
+    """
+    Record the gallery inputs once all the builder-inited handlers
+    (e.g. nbheader) are done updating the notebooks.
+    """
+    if DEFAULT_GALLERY_CONF == app.config.gallery_conf:
+        return
+    with open(_fingerprint_path(app), 'w') as f:
+        f.write(_gallery_fingerprint(app))
+
+
 def setup(app):
     app.add_config_value('gallery_conf', DEFAULT_GALLERY_CONF, 'html')
     app.connect('builder-inited', generate_gallery_rst)
+    app.connect('env-before-read-docs', record_gallery_fingerprint)
     metadata = {'parallel_read_safe': True,
                 'version': '0.0.1'}
     return metadata
@@ -1,20 +1,76 @@
-import glob
-import os
+import concurrent.futures
+import hashlib
 
 from pathlib import Path
 
 import nbformat
 import sphinx.util
 
+from _gallery_common import cell_source, list_files, read_notebook
+
 logger = sphinx.util.logging.getLogger('nbheader-extension')
 
+# Metadata key of the prolog cell storing a hash of the prolog.
+HASH_KEY = 'nbheader_hash'
+# The prolog cell is the first cell, its metadata is found at the
+# very beginning of the notebook file.
+HEAD_SIZE = 4096
+# Below this number of notebooks to update, starting a process pool
+# costs more than it saves.
+MIN_POOL_SIZE = 8
+
+
+def list_notebooks(dirpath):
+    """
+    Return the paths of the notebooks found in a directory.
+    """
+    return [
+        Path(path) for path, name, _ in list_files(dirpath)
+        if name.endswith('.ipynb')
+    ]
+
+
+def prolog_cell_source(prolog):
+    return "```{eval-rst}\n" + prolog + "\n```"
+
+
+def prolog_hash(source):
+    return hashlib.blake2b(source.encode(), digest_size=16).hexdigest()
+
+
+def has_prolog(nb_path, prolog):
+    """
+    Whether the prolog was already inserted in the notebook, e.g. when
+    the extension is run multiple times, checked without parsing the
+    whole notebook.
+    """
+    source_hash = prolog_hash(prolog_cell_source(prolog))
+    with open(nb_path, 'rb') as f:
+        head = f.read(HEAD_SIZE)
+    return f'"{HASH_KEY}": "{source_hash}"'.encode() in head
+
 
 def insert_prolog(nb_path, prolog):
-    nb = nbformat.read(nb_path, as_version=4)
+    """
+    Insert the prolog in a notebook, for which has_prolog is expected
+    to have been checked already.
+    """
+    prolog = prolog_cell_source(prolog)
+    source_hash = prolog_hash(prolog)
+
+    nb = read_notebook(nb_path)
     first_cell = nb['cells'][0]
-    prolog = "```{eval-rst}\n" + prolog + "\n```"
-    prolog_cell = nbformat.v4.new_markdown_cell(source=prolog)
-    if "```{eval-rst}" in first_cell['source']:
+    first_source = cell_source(first_cell)
+    # The notebook already starts with this prolog, e.g. inserted before
+    # it was hashed: only stamp the hash so has_prolog finds it next time.
+    if first_cell['cell_type'] == 'markdown' and first_source == prolog:
+        first_cell['metadata'][HASH_KEY] = source_hash
+        nbformat.write(nb, nb_path, version=nbformat.NO_CONVERT)
+        return
+    prolog_cell = nbformat.v4.new_markdown_cell(
+        source=prolog, metadata={HASH_KEY: source_hash},
+    )
+    if "```{eval-rst}" in first_source:
         nb['cells'][0] = prolog_cell
     else:
         nb['cells'].insert(0, prolog_cell)
@@ -34,19 +90,33 @@ def add_nbheader(app):
     sections = gallery_conf['sections']
     doc_dir = Path(app.builder.srcdir)
     gallery_path = doc_dir / gallery_conf['path']
+    nb_files, nb_prologs = [], []
     for section in sections:
         prolog = section['prolog']
         project_path = gallery_path / section['path']
-        nb_files = glob.glob(os.path.join(project_path, '*.ipynb'))
-        for nb_file in nb_files:
-            nb_file = Path(nb_file)
+        for nb_file in list_notebooks(project_path):
             # Used by examples.holoviz.org to link to the viewed notebook
             nb_prolog = prolog
             if '/notebooks/{template_notebook_filename}' in prolog:
                 nb_prolog = prolog.format(
                     template_notebook_filename=nb_file.name,
                 )
+            # Checked here rather than in the workers, on rebuilds most
+            # notebooks already have their prolog.
+            if has_prolog(nb_file, nb_prolog):
+                continue
+            nb_files.append(nb_file)
+            nb_prologs.append(nb_prolog)
+
+    if len(nb_files) < MIN_POOL_SIZE:
+        for nb_file, nb_prolog in zip(nb_files, nb_prologs):
             insert_prolog(nb_file, nb_prolog)
+        return
+
+    # Each notebook is parsed and written independently, spread that
+    # CPU-bound work over multiple processes.
+    with concurrent.futures.ProcessPoolExecutor() as executor:
+        list(executor.map(insert_prolog, nb_files, nb_prologs, chunksize=4))
 
 
 def setup(app):
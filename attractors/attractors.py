@@ -18,34 +18,110 @@ import param
 import inspect
 import yaml
 
-from numba import jit
-from numpy import sin, cos, sqrt, fabs
+from numba import jit, prange
+from math import sin, cos, sqrt, fabs
 from param import concrete_descendents
 
 import numpy.random as npr
 npr.seed(12)
 
 
+# The kernels below take the attractor fn as an argument. Numba keys their
+# compiled code on the type of that dispatcher, which is not stable across
+# processes, so they can't use cache=True and are compiled on first call.
 @jit
 def trajectory_coords(fn, x0, y0, a, b, c, d, e, f, n):
     """
     Given an attractor fn with up to six parameters a-e, compute n trajectory points
     (starting from x0,y0). Numba-optimized to run at machine-code speeds.
     """
-    x, y = np.zeros(n), np.zeros(n)
-    x[0], y[0] = x0, y0
-    for i in np.arange(n-1):
-        x[i+1], y[i+1] = fn(x[i], y[i], a, b, c, d, e, f)
+    x, y = np.empty(n), np.empty(n)
+    xc, yc = x0, y0
+    x[0], y[0] = xc, yc
+    for i in range(1, n):
+        xc, yc = fn(xc, yc, a, b, c, d, e, f)
+        x[i], y[i] = xc, yc
     return x, y
 
 
+@jit
+def trajectory_coords_batch(fn, x0s, y0s, a, b, c, d, e, f, n):
+    """
+    Like trajectory_coords, but evolves one trajectory per (x0,y0) seed in lockstep,
+    returning (n, B) arrays of x and y coordinates with one column per seed.
+    """
+    B = len(x0s)
+    x, y = np.empty((n, B)), np.empty((n, B))
+    x[0], y[0] = x0s, y0s
+    for i in range(n-1):
+        for j in range(B):
+            x[i+1, j], y[i+1, j] = fn(x[i, j], y[i, j], a, b, c, d, e, f)
+    return x, y
+
+
+@jit(parallel=True)
+def trajectory_coords_many(fn, x0s, y0s, a, b, c, d, e, f, n):
+    """
+    Like trajectory_coords_batch, but x0s, y0s and the parameters a-f are all
+    length-B arrays, giving each trajectory its own parameters. Trajectories are
+    computed in parallel and returned as (B, n) arrays with one row per trajectory.
+    """
+    B = len(x0s)
+    x, y = np.empty((B, n)), np.empty((B, n))
+    for j in prange(B):
+        xc, yc = x0s[j], y0s[j]
+        x[j, 0], y[j, 0] = xc, yc
+        for i in range(1, n):
+            xc, yc = fn(xc, yc, a[j], b[j], c[j], d[j], e[j], f[j])
+            x[j, i], y[j, i] = xc, yc
+    return x, y
+
+
+@jit
+def trajectory_fill(fn, x, y, x0, y0, a, b, c, d, e, f):
+    """
+    Fill the arrays x,y with consecutive trajectory points starting from x0,y0,
+    returning the point that follows the last one written.
+    """
+    xc, yc = x0, y0
+    for i in range(len(x)):
+        x[i], y[i] = xc, yc
+        xc, yc = fn(xc, yc, a, b, c, d, e, f)
+    return xc, yc
+
+
+def trajectory_chunks(fn, x0, y0, a, b=None, c=None, d=None, e=None, f=None, n=1000000, chunk=131072):
+    """
+    Given an attractor fn with up to six parameters a-e, generate n trajectory points
+    (starting from x0,y0) as successive (xs, ys) pairs of at most *chunk* points each.
+
+    The same two buffers are reused for every chunk, keeping the working set small
+    enough to stay in cache; consume or copy each chunk before requesting the next.
+    """
+    xbuf, ybuf = np.empty(min(n, chunk)), np.empty(min(n, chunk))
+    xc, yc = x0, y0
+    for start in range(0, n, chunk):
+        m = min(chunk, n - start)
+        xc, yc = trajectory_fill(fn, xbuf[:m], ybuf[:m], xc, yc, a, b, c, d, e, f)
+        yield xbuf[:m], ybuf[:m]
+
+
+def trajectory_arrays(fn, x0, y0, a, b=None, c=None, d=None, e=None, f=None, n=1000000):
+    """
+    Given an attractor fn with up to six parameters a-e, compute n trajectory points
+    (starting from x0,y0) and return them as a pair of x and y arrays.
+    """
+    return trajectory_coords(fn, x0, y0, a, b, c, d, e, f, n)
+
+
 def trajectory(fn, x0, y0, a, b=None, c=None, d=None, e=None, f=None, n=1000000):
     """
     Given an attractor fn with up to six parameters a-e, compute n trajectory points
     (starting from x0,y0) and return as a Pandas dataframe with columns x,y.
     """
-    xs, ys = trajectory_coords(fn, x0, y0, a, b, c, d, e, f, n)
-    return pd.DataFrame(dict(x=xs,y=ys))
+    xs, ys = trajectory_arrays(fn, x0, y0, a, b, c, d, e, f, n)
+    # Wrap the freshly allocated arrays rather than copying them
+    return pd.DataFrame(dict(x=xs,y=ys), copy=False)
 
 
 
@@ -67,19 +143,27 @@ class Attractor(param.Parameterized):
 
     __abstract = True
 
-    def __call__(self, n, x=None, y=None):
-        """Return a dataframe with *n* points"""
+    _sig = ()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        # Inspect the attractor function once per class rather than on every call
+        if 'fn' in vars(cls):
+            cls._sig = tuple(inspect.signature(cls.fn).parameters)[:-1]
+
+    def __call__(self, n, x=None, y=None, as_arrays=False):
+        """Return a dataframe with *n* points, or (xs, ys) arrays if as_arrays is True"""
         if x is not None: self.x=x
         if y is not None: self.y=y
-        args = [getattr(self,p) for p in self.sig()]
-        return trajectory(self.fn, *args, n=n)
+        args = [getattr(self,p) for p in self._sig]
+        return (trajectory_arrays if as_arrays else trajectory)(self.fn, *args, n=n)
 
     def vals(self):
-        return [self.__class__.name] + [self.colormap] + [getattr(self,p) for p in self.sig()]
+        return [self.__class__.name] + [self.colormap] + [getattr(self,p) for p in self._sig]
 
     def sig(self):
         """Returns the calling signature expected by this attractor function"""
-        return list(inspect.signature(self.fn).parameters.keys())[:-1]
+        return list(self._sig)
 
 
 class FourParamAttractor(Attractor):
@@ -95,7 +179,7 @@ class Clifford(FourParamAttractor):
                             r'$y_{n+1} = \sin\ bx_n + d\ \cos\ by_n$'])
 
     @staticmethod
-    @jit
+    @jit(cache=True)
     def fn(x, y, a, b, c, d, *o):
         return sin(a * y) + c * cos(a * x), \
                sin(b * x) + d * cos(b * y)
@@ -106,7 +190,7 @@ class De_Jong(FourParamAttractor):
                             r'$y_{n+1} = \sin\ cx_n - d\ \cos\ dy_n$'])
 
     @staticmethod
-    @jit
+    @jit(cache=True)
     def fn(x, y, a, b, c, d, *o):
         return sin(a * y) - cos(b * x), \
                sin(c * x) - cos(d * y)
@@ -117,10 +201,12 @@ class Svensson(FourParamAttractor):
                             r'$y_{n+1} = c\ \cos\ ax_n + \cos\ by_n$'])
 
     @staticmethod
-    @jit
+    @jit(cache=True)
     def fn(x, y, a, b, c, d, *o):
-        return d * sin(a * x) - sin(b * y), \
-               c * cos(a * x) + cos(b * y)
+        # Shared arguments let LLVM fuse each sin/cos pair into one sincos call
+        ax, by = a * x, b * y
+        return d * sin(ax) - sin(by), \
+               c * cos(ax) + cos(by)
 
 
 class Fractal_Dream(Attractor):
@@ -131,7 +217,7 @@ class Fractal_Dream(Attractor):
     d = param.Number(2.34, softbounds=(-0.5, 1.5), doc="Attractor parameter d")
 
     @staticmethod
-    @jit
+    @jit(cache=True)
     def fn(x, y, a, b, c, d, *o):
         return sin(b*y)+c*sin(b*x), \
                sin(a*x)+d*sin(a*y)
@@ -145,17 +231,23 @@ class Bedhead(Attractor):
     b = param.Number(0.76, bounds=(-1, 1))
 
     @staticmethod
-    @jit
+    @jit(cache=True)
     def fn(x, y, a, b, *o):
         return y*sin(x*y/b) + cos(a*x-y), \
                x + sin(y)/b
 
-    def __call__(self, n):
+    def __call__(self, n, **kwargs):
         # Avoid interactive divide-by-zero errors for b
         epsilon = 3*np.finfo(float).eps
         if -epsilon < self.b < epsilon:
             self.b = epsilon
-        return super(Bedhead,self).__call__(n)
+        return super(Bedhead,self).__call__(n, **kwargs)
+
+
+@jit(cache=True)
+def sgn(x):
+    """Branchless np.sign for scalars, sgn(0) == 0"""
+    return (x > 0.0) - (x < 0.0)
 
 
 class Hopalong1(Attractor):
@@ -167,9 +259,9 @@ class Hopalong1(Attractor):
     c = param.Number(3.8, bounds=(0, 10), doc="Attractor parameter c")
 
     @staticmethod
-    @jit
+    @jit(cache=True)
     def fn(x, y, a, b, c, *o):
-        return y - sqrt(fabs(b * x - c)) * np.sign(x), \
+        return y - sqrt(fabs(b * x - c)) * sgn(x), \
                a - x
 
 
@@ -178,13 +270,13 @@ class Hopalong2(Hopalong1):
                             r'$y_{n+1} = a-x_n-1$'])
 
     @staticmethod
-    @jit
+    @jit(cache=True)
     def fn(x, y, a, b, c, *o):
-        return y - 1.0 - sqrt(fabs(b * x - 1.0 - c)) * np.sign(x - 1.0), \
+        return y - 1.0 - sqrt(fabs(b * x - 1.0 - c)) * sgn(x - 1.0), \
                a - x - 1.0
 
 
-@jit
+@jit(cache=True)
 def G(x, mu):
     return mu * x + 2 * (1 - mu) * x**2 / (1.0 + x**2)
 
@@ -200,7 +292,7 @@ class Gumowski_Mira(Attractor):
     mu = param.Number(0.6, softbounds=( -2,  2), doc="Attractor parameter mu")
 
     @staticmethod
-    @jit
+    @jit(cache=True)
     def fn(x, y, a, b, mu, *o):
         xn = y + a*(1 - b*y**2)*y  +  G(x, mu)
         yn = -x + G(xn, mu)
@@ -216,7 +308,7 @@ class Symmetric_Icon(Attractor):
     d = param.Number(1.2, softbounds=( 1,  20),  bounds=(None,None), doc="Attractor parameter degree")
 
     @staticmethod
-    @jit
+    @jit(cache=True)
     def fn(x, y, a, b, g, om, l, d, *o):
         zzbar = x*x + y*y
         p = a*zzbar + l
@@ -269,6 +361,7 @@ class ParameterSets(param.Parameterized):
             assert(vals and len(vals) > 0)
             self.param.example.objects[:] = vals
             self.example = vals[0]
+        self._index()
 
     def _save(self):
         if self.output_examples_filename == self.param.input_examples_filename.default:
@@ -281,20 +374,29 @@ class ParameterSets(param.Parameterized):
 
     def _randomize(self):
         npr.shuffle(self.param.example.objects)
+        self._index()
 
     def _sort(self):
         self.param.example.objects[:] = list(sorted(self.param.example.objects))
+        self._index()
 
     def _add_item(self, item):
         self.param.example.objects += [item]
+        self._by_name.setdefault(item[0], []).append(item[1:])
         self.example = item
 
+    def _index(self):
+        """Group the example argument lists by attractor name, in example order"""
+        self._by_name = {}
+        for v in self.param.example.objects:
+            self._by_name.setdefault(v[0], []).append(v[1:])
+
     def _remember(self):
         vals = self.current().vals()
         self._add_item(vals)
 
     def args(self, name):
-        return [v[1:] for v in self.param.example.objects if v[0] == name]
+        return list(self._by_name.get(name, []))
 
     def attractor(self, name, *args):
         """Factory function to return an Attractor object with the given name and arg values"""
@@ -1,20 +1,31 @@
 # -*- coding: utf-8 -*-
+import atexit
+import concurrent.futures
 import os
+import pickle
 import sys
 
-import yaml
+import sphinx.util.logging
 
 from nbsite.shared_conf import *
 
-# To reuse utilities in dodo.py
-sys.path.insert(0, '..')
+logger = sphinx.util.logging.getLogger('conf')
 
-# To import the local sphinx extension
-sys.path.insert(0, os.path.abspath("../_extensions"))
+# Guarded so that re-executing conf.py (e.g. with sphinx-autobuild)
+# doesn't keep growing sys.path
+for _path in [
+    # To reuse utilities in dodo.py
+    os.path.abspath('..'),
+    # To import the local sphinx extension
+    os.path.abspath("../_extensions"),
+]:
+    if _path not in sys.path:
+        sys.path.insert(0, _path)
 
 from dodo import (
-    all_project_names, deployment_cmd_to_endpoint, last_commit_date,
-    projname_to_title, find_notebooks, DEFAULT_DOC_EXCLUDE
+    all_project_names, deployment_cmd_to_endpoint, find_notebooks,
+    last_commit_date, last_commit_dates, project_spec, projname_to_title,
+    DEFAULT_DOC_EXCLUDE
 )
 
 project = 'Examples'
@@ -125,8 +136,22 @@ PROLOG_TEMPLATE = """
 # and in a hashed subfolder to prevent collisions.
 # Some CSS was required to style it as it looked a little weird.
 
-AUTHOR_TEMPLATE = '`{author} <https://github.com/{author}>`_'
-DEPLOYMENT_TEMPLATE = """
+# Deployment command: (link text, material icon, endpoint suffix)
+DEPLOYMENT_META = {
+    # nbsite will look for "/notebooks/{template_notebook_filename}"
+    # and replace {template_notebook_filename} by the notebook
+    # filename where the metadata prolog is injected.
+    'notebook': ('Run notebook', 'smart_display', '/notebooks/{template_notebook_filename}'),
+    'dashboard': ('Open app(s)', 'dashboard', ''),
+}
+
+def format_author(author):
+    return f'`{author} <https://github.com/{author}>`_'
+
+def format_deployment(command, name):
+    text, material_icon, suffix = DEPLOYMENT_META[command]
+    endpoint = deployment_cmd_to_endpoint(command, name) + suffix
+    return f"""
          .. grid-item::
             :columns: auto
             :class: nbsite-metadata
@@ -134,11 +159,76 @@ DEPLOYMENT_TEMPLATE = """
             :material-outlined:`{material_icon};24px` `{text} <{endpoint}>`_
 """
 
+# Parsed anaconda-project.yml files and project notebook listings, kept
+# across builds and keyed by the file/directory stat so that they are
+# computed again when they change.
+SPEC_CACHE_PATH = os.path.abspath('.gallery_spec_cache.pkl')
+# Bump when what is cached changes, to discard the entries of older builds
+_SPEC_CACHE_VERSION = 1
+
+def _load_spec_cache():
+    try:
+        with open(SPEC_CACHE_PATH, 'rb') as f:
+            version, entries = pickle.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, EOFError, pickle.UnpicklingError, ValueError, TypeError,
+            AttributeError, ImportError) as e:
+        logger.info(f'Discarding unreadable spec cache {SPEC_CACHE_PATH}: {e}')
+        return {}
+    if version != _SPEC_CACHE_VERSION or not isinstance(entries, dict):
+        return {}
+    return entries
+
+_spec_cache = _load_spec_cache()
+_spec_cache_misses = []
+
+@atexit.register
+def _save_spec_cache():
+    if not _spec_cache_misses:
+        return
+    try:
+        with open(SPEC_CACHE_PATH, 'wb') as f:
+            pickle.dump(
+                (_SPEC_CACHE_VERSION, _spec_cache), f,
+                protocol=pickle.HIGHEST_PROTOCOL,
+            )
+    except OSError:
+        pass
+
+def load_project_spec(name):
+    """dodo.project_spec, cached across builds until the spec file changes"""
+    path = os.path.abspath(os.path.join('..', name, 'anaconda-project.yml'))
+    stat = os.stat(path)
+    key = (stat.st_mtime_ns, stat.st_size)
+    cached = _spec_cache.get(path)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+    spec = project_spec(os.path.join('..', name))
+    _spec_cache[path] = (key, spec)
+    _spec_cache_misses.append(path)
+    return spec
+
+def notebook_stems(name):
+    """
+    Return the stems of the notebooks found by dodo.find_notebooks, cached
+    across builds until the project directory or its notebooks_to_skip change.
+    """
+    spec = load_project_spec(name)
+    skipped = spec.get('examples_config', {}).get('notebooks_to_skip', [])
+    project_dir = os.path.abspath(os.path.join('..', name))
+    # Adding, removing or renaming a notebook updates the directory mtime
+    key = (os.stat(project_dir).st_mtime_ns, tuple(skipped))
+    cached = _spec_cache.get(project_dir)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+    stems = [notebook.stem for notebook in find_notebooks(name, root='..')]
+    _spec_cache[project_dir] = (key, stems)
+    _spec_cache_misses.append(project_dir)
+    return stems
+
 def gallery_spec(name):
-    path = os.path.join('..', name, 'anaconda-project.yml')
-    with open(path) as f:
-        spec = yaml.safe_load(f)
-    title = projname_to_title(spec['name'])
+    spec = load_project_spec(name)
     description = spec['description']
     # Examples specific spec.
     # TODO: isn't optional
@@ -152,35 +242,21 @@ def gallery_spec(name):
     # TODO: is optional, if not provided is computed
     last_updated = examples_config.get('last_updated', '')
     if not last_updated:
-        last_updated = last_commit_date(name, root='..', verbose=False)
-    title = examples_config.get('title', '') or projname_to_title(spec['name'])
+        last_updated = (
+            _last_commit_dates.get(name)
+            or last_commit_date(name, root='..', verbose=False)
+        )
+    title = examples_config.get('title') or projname_to_title(spec['name'])
     # Default is empty string as deployments is injected into PROLOG_TEMPLATE
     deployments = examples_config.get('deployments', '')
 
     if authors:
-        authors = [AUTHOR_TEMPLATE.format(author=author) for author in authors]
-        authors = ', '.join(authors)
+        authors = ', '.join(map(format_author, authors))
 
     if deployments:
-        _formatted_deployments = []
-        for depl in deployments:
-            if depl['command'] == 'notebook':
-                text = 'Run notebook'
-                material_icon = 'smart_display'
-                endpoint = deployment_cmd_to_endpoint(depl['command'], name)
-                # nbsite will look for "/notebooks/{template_notebook_filename}"
-                # and replace {template_notebook_filename} by the notebook
-                # filename where the metadata prolog is injected.
-                endpoint += '/notebooks/{template_notebook_filename}'
-            elif depl['command'] == 'dashboard':
-                text = 'Open app(s)'
-                material_icon = 'dashboard'
-                endpoint = deployment_cmd_to_endpoint(depl['command'], name)
-            formatted_depl = DEPLOYMENT_TEMPLATE.format(
-                text=text, material_icon=material_icon, endpoint=endpoint
-            )
-            _formatted_deployments.append(formatted_depl)
-        deployments = '\n\n'.join(_formatted_deployments)
+        deployments = '\n\n'.join(
+            format_deployment(depl['command'], name) for depl in deployments
+        )
 
     prolog = PROLOG_TEMPLATE.format(
         created=created, authors=authors, last_updated=last_updated,
@@ -207,12 +283,20 @@ projects = [SINGLE_PROJECT] if SINGLE_PROJECT else all_projects
 if SINGLE_PROJECT:
     # Tell Sphinx to ignore other projects if they are already in doc/
     exclude_patterns = [
-        os.path.join('gallery', project) + '*'
+        f'gallery/{project}*'
         for project in all_projects
         if project != SINGLE_PROJECT
     ]
 
-print('Project(s) that will be built:', projects)
+logger.info(f'Project(s) that will be built: {projects}')
+
+# One git log walk for all the projects, gallery_spec only falls back to
+# running git itself for projects that aren't found.
+_last_commit_dates = last_commit_dates(projects, root='..')
+
+# Each spec reads a YAML file and runs git, so fetch them concurrently
+with concurrent.futures.ThreadPoolExecutor() as executor:
+    sections = list(executor.map(gallery_spec, projects))
 
 gallery_conf = {
     'github_org': 'holoviz-topics',
@@ -222,23 +306,20 @@ gallery_conf = {
     'path': 'gallery',
     'title': 'Gallery',
     'intro': long_description,
-    'sections': [gallery_spec(project) for project in projects],
+    'sections': sections,
 }
 
 def to_gallery_redirects():
-    # Redirects from /projname to /gallery/projname/<index>
-    redirects = {}
+    # Redirects from /projname to /gallery/projname/<index>, as (source, target) pairs
     for project in projects:
-        notebooks = find_notebooks(project, root='..')
-        nbstems = [nb.stem for nb in notebooks]
+        nbstems = notebook_stems(project)
         if 'index' in nbstems:
             index = 'index'
         elif len(nbstems) == 1:
             index = nbstems[0]
         else:
             raise RuntimeError(f'Too many notebooks found: {nbstems}')
-        redirects[project] = f'gallery/{project}/{index}'
-    return redirects
+        yield project, f'gallery/{project}/{index}'
 
 top_level_redirects = {
     # For the transition between examples.pyviz.org and examples.holoviz.org
@@ -295,18 +376,19 @@ project_direct_links = {
 }
 
 if SINGLE_PROJECT:
+    _single_project_prefix = SINGLE_PROJECT + '/'
     project_direct_links = {
         k: v
         for k, v in project_direct_links.items()
-        if k.split('/')[0] == SINGLE_PROJECT
+        if k.startswith(_single_project_prefix)
     }
 
 rediraffe_redirects = {
     **top_level_redirects,
     **project_direct_links,
-    # Links from e.g. /attractors to /gallery/attractors/index.html
-    **to_gallery_redirects(),
 }
+# Links from e.g. /attractors to /gallery/attractors/index.html
+rediraffe_redirects.update(to_gallery_redirects())
 
 html_context.update({
     "last_release": f"v{release}",
@@ -2,7 +2,9 @@
 # Inline external libraries imports.
 import collections
 import contextlib
+import copy
 import datetime
+import functools
 import glob
 import imghdr
 import itertools
@@ -156,13 +158,13 @@ def all_project_names(root, exclude=DEFAULT_EXCLUDE):
     if root == '':
         root = os.getcwd()
     root = os.path.abspath(root)
-    projects = []
-    for path in pathlib.Path(root).iterdir():
-        if not path.is_dir():
-            continue
-        if path.name in exclude:
-            continue
-        projects.append(path.name)
+    exclude = set(exclude)
+    with os.scandir(root) as entries:
+        projects = [
+            entry.name
+            for entry in entries
+            if entry.name not in exclude and entry.is_dir()
+        ]
     return sorted(projects)
 
 
@@ -215,10 +217,14 @@ def find_notebooks(proj_dir_name, exclude_config=['notebooks_to_skip'], root='')
         excluded.extend(spec.get('examples_config', {}).get('notebooks_to_skip', []))
 
     notebooks = []
-    for notebook in proj_dir.glob('*.ipynb'):
-        if notebook.name in excluded:
-            continue
-        notebooks.append(notebook)
+    with os.scandir(proj_dir) as entries:
+        for entry in entries:
+            # Same as glob('*.ipynb'), which skips hidden files
+            if not entry.name.endswith('.ipynb') or entry.name.startswith('.'):
+                continue
+            if entry.name in excluded:
+                continue
+            notebooks.append(proj_dir / entry.name)
     return notebooks
 
 
@@ -257,6 +263,40 @@ def last_commit_date(name, root='.', verbose=True):
     return last_committer_date
 
 
+def last_commit_dates(names, root='.'):
+    """
+    Return a dict mapping names (directories in root) to their last committer
+    date as 'YYYY-MM-DD', using a single git log walk for all of them.
+
+    Names not found in the history are missing from the returned dict.
+    """
+    remaining = set(names)
+    dates = {}
+    if not remaining:
+        return dates
+    # Each commit starts with a NUL-prefixed date line followed by the
+    # (root-relative) paths it touched; the log is newest first, so the
+    # first commit seen for a name is its last one.
+    with subprocess.Popen(
+        ['git', '-C', root, 'log', '--relative', '--name-only',
+         '--pretty=format:%x00%cs', '--', *sorted(remaining)],
+        stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True,
+    ) as proc:
+        date = None
+        for line in proc.stdout:
+            if line.startswith('\0'):
+                date = line[1:].rstrip('\n')
+                continue
+            name = line.split('/', 1)[0]
+            if name in remaining:
+                dates[name] = date
+                remaining.discard(name)
+                if not remaining:
+                    proc.kill()
+                    break
+    return dates
+
+
 def print_changes_in_dir(filepath='.diff'):
     """Dumps as JSON a dict of the changed projects and removed projects.
 
@@ -289,13 +329,18 @@ def print_changes_in_dir(filepath='.diff'):
     print(json.dumps(updates))
 
 
+def _dir_has_entries(path):
+    """Whether path is a directory with at least one entry"""
+    try:
+        with os.scandir(path) as entries:
+            return next(entries, None) is not None
+    except (FileNotFoundError, NotADirectoryError):
+        return False
+
+
 def project_has_data_folder(name):
     """Whether a project has a data folder"""
-    path = pathlib.Path(name) / 'data'
-    if not path.is_dir():
-        return False
-    has_files = any(path.iterdir())
-    return has_files
+    return _dir_has_entries(pathlib.Path(name) / 'data')
 
 
 def project_has_no_data_ingestion(name):
@@ -327,11 +372,7 @@ def project_has_test_catalog(name):
 
 def project_has_test_data(name):
     """Whether a project has a test data"""
-    path = pathlib.Path('test_data') / name
-    if not path.is_dir():
-        return False
-    has_files = any(path.iterdir())
-    return has_files
+    return _dir_has_entries(pathlib.Path('test_data') / name)
 
 
 def remove_empty_dirs(path):
@@ -426,16 +467,34 @@ def _prepare_paths(root, name, test_data, filename='catalog.yml'):
     }
 
 
+@functools.lru_cache(maxsize=None)
+def _load_project_spec(path, mtime_ns, size):
+    """
+    Parse a project spec, cached by path and by the file's mtime and size
+    so that an edited spec is parsed again.
+    """
+    from yaml import load
+    try:
+        from yaml import CSafeLoader as SafeLoader
+    except ImportError:
+        from yaml import SafeLoader
+
+    # A single read, so that LibYAML scans an in-memory buffer instead of
+    # calling back into the file object
+    with open(path, 'rb') as f:
+        data = f.read()
+    return load(data, Loader=SafeLoader)
+
+
 def project_spec(projname, filename='anaconda-project.yml'):
     """
     Return the spec of a project.
     """
-    from yaml import safe_load
-
-    path = pathlib.Path(projname) / filename
-    with open(path, 'r') as f:
-        spec = safe_load(f)
-    return spec
+    path = os.path.abspath(pathlib.Path(projname) / filename)
+    stat = os.stat(path)
+    spec = _load_project_spec(path, stat.st_mtime_ns, stat.st_size)
+    # Callers are free to modify the spec they get, not the cached one
+    return copy.deepcopy(spec)
 
 
 def projname_to_servername(name):
@@ -2308,6 +2367,8 @@ def task_doc_build_website():
             lambda: shutil.rmtree('jupyter_execute', ignore_errors=True),
             clean_rst,
             lambda: pathlib.Path("doc/gallery/index.rst").unlink(missing_ok=True),
+            lambda: pathlib.Path("doc/gallery/.gallery_fingerprint").unlink(missing_ok=True),
+            lambda: pathlib.Path("doc/.gallery_spec_cache.pkl").unlink(missing_ok=True),
         ]
     }
 